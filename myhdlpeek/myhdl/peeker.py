@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2017-2024, Dave Vandenbout. The MIT License (MIT).
 import functools
-from builtins import dict, int, str, super
 from myhdl import EnumItemType, SignalType, intbv,  always_comb, now
 from myhdl.conversion import _toVerilog, _toVHDL
 from ..peekerbase import *
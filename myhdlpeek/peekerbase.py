@@ -6,17 +6,16 @@
 
 
 import json
+import operator
 import re
-from builtins import dict, int, str, super
-from collections import namedtuple
+from collections import Counter, namedtuple
 
-import IPython.display as DISP
-import matplotlib.pyplot as plt
-import nbwavedrom
 from tabulate import tabulate
 
 from .trace import *
 
+# Splits a peeker name into the part preceding any brackets and its trailing index.
+_NAME_INDEX_RE = re.compile(r"^([^\[]*)(?:.*\[(\d+)\]$)?")
 
 
 class PeekerBase(object):
@@ -27,6 +26,8 @@ class PeekerBase(object):
 
     unit_time = None  # Time interval for a single tick-mark span.
 
+    _names_clean = True  # False when peeker names may need their indices removed.
+
     def __new__(cls, *args, **kwargs):
         # Keep PeekerBase from being instantiated.
         if cls is PeekerBase:
@@ -42,15 +43,11 @@ class PeekerBase(object):
         self.config(**kwargs)
 
         # Assign a unique name to this peeker.
-        self.name_dup = False  # Start off assuming the name has no duplicates.
         index = 0  # Starting index for disambiguating duplicates.
         nm = "{name}[{index}]".format(**locals())  # Create name with bracketed index.
         # Search through the peeker names for a match.
         while nm in self.peekers:
-            # A match was found, so mark the matching names as duplicates.
-            self.peekers[nm].name_dup = True
-            self.name_dup = True
-            # Go to the next index and see if that name is taken.
+            # A match was found, so go to the next index and see if that name is taken.
             index += 1
             nm = "{name}[{index}]".format(**locals())
         self.trace.name = nm  # Assign the unique name.
@@ -60,6 +57,7 @@ class PeekerBase(object):
 
         # Add this peeker to the global list.
         self.peekers[self.trace.name] = self
+        type(self)._names_clean = False
 
     @classmethod
     def config_defaults(cls, **kwargs):
@@ -104,7 +102,8 @@ class PeekerBase(object):
 
         # Remaining keyword args.
         for k, v in kwargs.items():
-            setattr(cls, k, copy(v))
+            # Only mutable values need copying; immutables can be shared.
+            setattr(cls, k, copy(v) if isinstance(v, (dict, list, set)) else v)
 
     def config(self, **kwargs):
         """
@@ -127,6 +126,7 @@ class PeekerBase(object):
         """Clear the global list of Peekers."""
         cls.peekers = dict()
         cls.unit_time = None
+        cls._names_clean = False
 
     @classmethod
     def clear_traces(cls):
@@ -138,12 +138,12 @@ class PeekerBase(object):
     @classmethod
     def start_time(cls):
         """Return the time of the first signal transition captured by the peekers."""
-        return min((p.trace.start_time() for p in cls.peekers))
+        return min((p.trace.start_time() for p in cls.peekers.values()))
 
     @classmethod
     def stop_time(cls):
         """Return the time of the last signal transition captured by the peekers."""
-        return max((p.trace.stop_time() for p in cls.peekers))
+        return max((p.trace.stop_time() for p in cls.peekers.values()))
 
     @classmethod
     def _clean_names(cls):
@@ -155,18 +155,51 @@ class PeekerBase(object):
         then the index is removed.
         """
 
-        index_re = "\[\d+\]$"
-        for name, peeker in list(cls.peekers.items()):
-            if not peeker.name_dup:
+        # Nothing to do if no peekers were added since the last cleaning.
+        if cls._names_clean:
+            return
+
+        # Count how many peekers share each base name.
+        base_names = {name: _strip_index(name) for name in cls.peekers}
+        counts = Counter(base_names.values())
+
+        # Build the renamed entries in one pass and then refill the peeker
+        # dict in place rather than popping and re-inserting each entry.
+        cleaned = dict()
+        for name, peeker in cls.peekers.items():
+            base_name = base_names[name]
+            if counts[base_name] == 1:
                 # Base name is not repeated, so remove any index.
-                new_name = re.sub(index_re, "", name)
-                if new_name != name:
-                    # Index got removed so name changed. Therefore,
-                    # remove the original entry and replace with
-                    # the renamed Peeker.
-                    cls.peekers.pop(name)
-                    peeker.trace.name = new_name
-                    cls.peekers[new_name] = peeker
+                name = base_name
+                peeker.trace.name = name
+            cleaned[name] = peeker
+        cls.peekers.clear()
+        cls.peekers.update(cleaned)
+
+        cls._names_clean = True
+
+    @classmethod
+    def _resolve_names(cls, names):
+        """
+        Return the list of individual peeker names to process.
+
+        Names containing spaces are split into individual names and repeats
+        of a peeker name are dropped. Names that don't match a peeker (such
+        as the "|" spacers for blank rows) are kept even if repeated. If no
+        names are given, then the sorted names of all the peekers are returned.
+        """
+        if not names:
+            return _sort_names(cls.peekers.keys())
+
+        resolved = []
+        seen = set()
+        for nm in (nm for name in names for nm in name.split()):
+            if nm in cls.peekers:
+                if nm in seen:
+                    continue  # Skip repeats of a peeker name.
+                seen.add(nm)
+            resolved.append(nm)
+        return resolved
 
     @classmethod
     def to_dataframe(cls, *names, **kwargs):
@@ -176,7 +209,8 @@ class PeekerBase(object):
         Args:
             *names: A list of strings containing the names for the Peekers that
                 will be processed. A string may contain multiple,
-                space-separated names.
+                space-separated names. A Peeker named more than once
+                is only processed once.
 
         Keywords Args:
             start_time: The earliest (left-most) time bound for the traces.
@@ -190,16 +224,11 @@ class PeekerBase(object):
 
         cls._clean_names()
 
-        if names:
-            # Go through the provided names and split any containing spaces
-            # into individual names.
-            names = [nm for name in names for nm in name.split()]
-        else:
-            # If no names provided, use all the peekers.
-            names = _sort_names(cls.peekers.keys())
+        names = cls._resolve_names(names)
 
         # Collect all the traces for the Peekers matching the names.
-        traces = [getattr(cls.peekers.get(name), "trace", None) for name in names]
+        peekers = cls.peekers
+        traces = [peekers[name].trace if name in peekers else None for name in names]
 
         return traces_to_dataframe(*traces, **kwargs)
 
@@ -211,7 +240,8 @@ class PeekerBase(object):
         Args:
             *names: A list of strings containing the names for the Peekers that
                 will be processed. A string may contain multiple,
-                space-separated names.
+                space-separated names. A Peeker named more than once
+                is only processed once.
 
         Keywords Args:
             start_time: The earliest (left-most) time bound for the traces.
@@ -225,16 +255,11 @@ class PeekerBase(object):
 
         cls._clean_names()
 
-        if names:
-            # Go through the provided names and split any containing spaces
-            # into individual names.
-            names = [nm for name in names for nm in name.split()]
-        else:
-            # If no names provided, use all the peekers.
-            names = _sort_names(cls.peekers.keys())
+        names = cls._resolve_names(names)
 
         # Collect all the traces for the Peekers matching the names.
-        traces = [getattr(cls.peekers.get(name), "trace", None) for name in names]
+        peekers = cls.peekers
+        traces = [peekers[name].trace if name in peekers else None for name in names]
 
         return traces_to_table_data(*traces, **kwargs)
 
@@ -246,14 +271,18 @@ class PeekerBase(object):
 
     @classmethod
     def to_text_table(cls, *names, **kwargs):
-        if "format" not in kwargs:
-            kwargs["format"] = "simple"
-        print(cls.to_table(*names, **kwargs))
+        format = kwargs.pop("format", "simple")
+        table_data, headers = cls.to_table_data(*names, **kwargs)
+        print(tabulate(tabular_data=table_data, headers=headers, tablefmt=format))
 
     @classmethod
     def to_html_table(cls, *names, **kwargs):
-        kwargs["format"] = "html"
-        tbl_html = cls.to_table(*names, **kwargs)
+        import IPython.display as DISP
+
+        # Let pandas build the HTML instead of formatting the table row-by-row.
+        kwargs.pop("format", None)
+        df = cls.to_dataframe(*names, **kwargs)
+        tbl_html = df.rename_axis("Time").reset_index().to_html(index=False)
 
         # Generate the HTML from the JSON.
         DISP.display_html(DISP.HTML(tbl_html))
@@ -278,7 +307,8 @@ class PeekerBase(object):
         Args:
             *names: A list of strings containing the names for the Peekers that
                 will be displayed. A string may contain multiple,
-                space-separated names.
+                space-separated names. A Peeker named more than once
+                is only displayed once.
 
         Keywords Args:
             start_time: The earliest (left-most) time bound for the waveform display.
@@ -293,27 +323,43 @@ class PeekerBase(object):
             time_fmt (dict): https://matplotlib.org/3.2.1/api/text_api.html#matplotlib.text.Text
             width: The width of the waveform display in inches.
             height: The height of the waveform display in inches.
+            save_only: If true, draw on a non-interactive Agg canvas that isn't
+                managed by pyplot. Use this when the figure will only be saved.
+            reuse: If true, clear and redraw a figure kept from an earlier call
+                with the same number of traces and size instead of making a
+                new one. Call close_fig() to release the kept figures.
+            rasterized: If true, draw the waveforms as bitmaps when saving to
+                vector formats like SVG or PDF. This shrinks files for long traces.
 
         Returns:
-            Figure and axes created by matplotlib.pyplot.subplots.
+            The matplotlib Figure and a NumPy array of its Axes, one per trace
+            from top to bottom, with all the Axes sharing the time axis. The
+            Figure comes from matplotlib.pyplot.figure, or is a bare Agg Figure
+            not managed by pyplot if save_only is true. If reuse is true, the
+            Figure and Axes may be ones returned by an earlier call. They're
+            redrawn by later calls with the same number of traces and size
+            until close_fig() is called. None is returned if none of the names
+            matched a Peeker.
         """
 
         cls._clean_names()
+        names = cls._resolve_names(names)
+
+        # Collect all the traces for the Peekers matching the names.
+        peekers = cls.peekers
+        traces = [peekers[name].trace if name in peekers else None for name in names]
+
+        # Nothing to display if none of the names matched a Peeker.
+        if all(trace is None for trace in traces):
+            return None
+
         if cls.unit_time is None:
             cls.unit_time = calc_unit_time(*cls.get_traces())
-        Trace.unit_time = cls.unit_time
 
-        if names:
-            # Go through the provided names and split any containing spaces
-            # into individual names.
-            names = [nm for name in names for nm in name.split()]
-        else:
-            # If no names provided, use all the peekers.
-            names = _sort_names(cls.peekers.keys())
+        # Make the Peekers' unit time the Trace default so later operations on
+        # the peeker traces (delay, anyedge, show_traces, ...) also use it.
+        Trace.unit_time = cls.unit_time
 
-        # Collect all the Peekers matching the names.
-        peekers = [cls.get(name) for name in names]
-        traces = [getattr(p, "trace", None) for p in peekers]
         return traces_to_matplotlib(*traces, **kwargs)
 
     @classmethod
@@ -324,7 +370,8 @@ class PeekerBase(object):
         Args:
             *names: A list of strings containing the names for the Peekers that
                 will be displayed. A string may contain multiple,
-                space-separated names.
+                space-separated names. A Peeker named more than once
+                is only displayed once.
 
         Keywords Args:
             start_time: The earliest (left-most) time bound for the waveform display.
@@ -339,21 +386,23 @@ class PeekerBase(object):
         """
 
         cls._clean_names()
+        names = cls._resolve_names(names)
+
+        # Collect all the traces for the Peekers matching the names.
+        peekers = cls.peekers
+        traces = [peekers[name].trace if name in peekers else None for name in names]
+
+        # Nothing to display if none of the names matched a Peeker.
+        if all(trace is None for trace in traces):
+            return {"signal": []}
+
         if cls.unit_time is None:
             cls.unit_time = calc_unit_time(*cls.get_traces())
-        Trace.unit_time = cls.unit_time
 
-        if names:
-            # Go through the provided names and split any containing spaces
-            # into individual names.
-            names = [nm for name in names for nm in name.split()]
-        else:
-            # If no names provided, use all the peekers.
-            names = _sort_names(cls.peekers.keys())
+        # Make the Peekers' unit time the Trace default so later operations on
+        # the peeker traces (delay, anyedge, show_traces, ...) also use it.
+        Trace.unit_time = cls.unit_time
 
-        # Collect all the Peekers matching the names.
-        peekers = [cls.peekers.get(name) for name in names]
-        traces = [getattr(p, "trace", None) for p in peekers]
         return traces_to_wavejson(*traces, **kwargs)
 
     @classmethod
@@ -364,7 +413,8 @@ class PeekerBase(object):
         Args:
             *names: A list of strings containing the names for the Peekers that
                 will be displayed. A string may contain multiple,
-                space-separated names.
+                space-separated names. A Peeker named more than once
+                is only displayed once.
 
         Keywords Args:
             start_time: The earliest (left-most) time bound for the waveform display.
@@ -391,6 +441,8 @@ class PeekerBase(object):
             )
         else:
             # Supports the new Jupyter Lab.
+            import nbwavedrom
+
             return nbwavedrom.draw(cls.to_wavejson(*names, **kwargs))
 
     def delay(self, delta):
@@ -401,80 +453,64 @@ class PeekerBase(object):
         """Return trace of sample values set to 1 (if true) or 0 (if false)."""
         return self.trace.binarize()
 
-    def __eq__(self, pkr):
-        return self.trace == pkr
-
-    def __ne__(self, pkr):
-        return self.trace != pkr
-
-    def __le__(self, pkr):
-        return self.trace <= pkr
-
-    def __ge__(self, pkr):
-        return self.trace >= pkr
-
-    def __lt__(self, pkr):
-        return self.trace < pkr
-
-    def __gt__(self, pkr):
-        return self.trace > pkr
-
-    def __add__(self, pkr):
-        return self.trace + pkr
-
-    def __sub__(self, pkr):
-        return self.trace - pkr
-
-    def __mul__(self, pkr):
-        return self.trace * pkr
-
-    def __floordiv__(self, pkr):
-        return self.trace // pkr
-
-    def __truediv__(self, pkr):
-        return self.trace / pkr
-
-    def __mod__(self, pkr):
-        return self.trace % pkr
-
-    def __lshift__(self, pkr):
-        return self.trace << pkr
-
-    def __rshift__(self, pkr):
-        return self.trace >> pkr
-
-    def __and__(self, pkr):
-        return self.trace & pkr
-
-    def __or__(self, pkr):
-        return self.trace | pkr
-
-    def __xor__(self, pkr):
-        return self.trace ^ pkr
-
-    def __pow__(self, pkr):
-        return self.trace ** pkr
-
-    def __pos__(self):
-        return +self.trace
-
-    def __neg__(self):
-        return -self.trace
-
-    def __not__(self):
-        return not self.trace
-
-    def __inv__(self):
-        return ~self.trace
-
-    def __abs__(self):
-        return abs(self.trace)
+    # Peekers compare by their traces' values, so they can't be hashed.
+    __hash__ = None
 
     def trig_times(self):
         """Return list of times trace value is true (non-zero)."""
         return self.trace.trig_times()
 
 
+# Operators that are applied to a Peeker's trace when used on the Peeker.
+_TRACE_OPS = {
+    "__eq__": operator.eq,
+    "__ne__": operator.ne,
+    "__le__": operator.le,
+    "__ge__": operator.ge,
+    "__lt__": operator.lt,
+    "__gt__": operator.gt,
+    "__add__": operator.add,
+    "__sub__": operator.sub,
+    "__mul__": operator.mul,
+    "__floordiv__": operator.floordiv,
+    "__truediv__": operator.truediv,
+    "__mod__": operator.mod,
+    "__lshift__": operator.lshift,
+    "__rshift__": operator.rshift,
+    "__and__": operator.and_,
+    "__or__": operator.or_,
+    "__xor__": operator.xor,
+    "__pow__": operator.pow,
+    "__pos__": operator.pos,
+    "__neg__": operator.neg,
+    "__not__": operator.not_,
+    "__inv__": operator.inv,
+    "__abs__": operator.abs,
+}
+
+
+def _forward_to_trace(op):
+    """Return a method that applies an operator to a Peeker's trace."""
+
+    def forward(self, *args):
+        return op(self.trace, *args)
+
+    return forward
+
+
+for _name, _op in _TRACE_OPS.items():
+    setattr(PeekerBase, _name, _forward_to_trace(_op))
+
+
+def _strip_index(name):
+    """Remove a bracketed index (e.g., '[3]') from the end of a peeker name."""
+    if name.endswith("]"):
+        i = name.rfind("[")
+        if i != -1 and name[i + 1 : -1].isdecimal():
+            return name[:i]
+    return name
+
+
 def _sort_names(names):
     """
     Sort peeker names by index and alphabetically.
@@ -482,20 +518,10 @@ def _sort_names(names):
     For example, the peeker names would be sorted as a[0], b[0], a[1], b[1], ...
     """
 
-    def index_key(lbl):
-        """Index sorting."""
-        m = re.match(".*\[(\d+)\]$", lbl)  # Get the bracketed index.
-        if m:
-            return int(m.group(1))  # Return the index as an integer.
-        return -1  # No index found so it comes before everything else.
-
-    def name_key(lbl):
-        """Name sorting."""
-        m = re.match("^([^\[]+)", lbl)  # Get name preceding bracketed index.
-        if m:
-            return m.group(1)  # Return name.
-        return ""  # No name found.
-
-    srt_names = sorted(names, key=name_key)
-    srt_names = sorted(srt_names, key=index_key)
-    return srt_names
+    def sort_key(lbl):
+        """Sort by bracketed index and then by the name preceding any brackets."""
+        m = _NAME_INDEX_RE.match(lbl)
+        index = int(m.group(2)) if m.group(2) else -1  # No index comes first.
+        return index, m.group(1)
+
+    return sorted(names, key=sort_key)
@@ -3,23 +3,79 @@
 # Copyright (c) 2017-2024, Dave Vandenbout. The MIT License (MIT).
 
 
+import contextvars
+import functools
 import json
 import math
 import operator
-from builtins import dict, int, str, super
-from collections import Counter, namedtuple
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
 from copy import copy
 
-import IPython.display as DISP
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from tabulate import tabulate
 
+try:
+    # Use the faster orjson encoder for WaveJSON if it's available.
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+    _json_dumps = json.dumps
 
 
 # Waveform samples consist of a time and a value.
 Sample = namedtuple("Sample", "time value")
 
+# Unit time for the display in progress. Setting this instead of Trace.unit_time
+# keeps one rendering from altering the unit time seen by any other.
+_unit_time_ctx = contextvars.ContextVar("unit_time")
+
+
+def _get_unit_time():
+    """Return the unit time for the current context, else the Trace default."""
+    return _unit_time_ctx.get(Trace.unit_time)
+
+
+# NumPy ufuncs that apply each operator to whole arrays of sample values.
+_OP_UFUNCS = {
+    operator.eq: np.equal,
+    operator.ne: np.not_equal,
+    operator.le: np.less_equal,
+    operator.ge: np.greater_equal,
+    operator.lt: np.less,
+    operator.gt: np.greater,
+    operator.add: np.add,
+    operator.sub: np.subtract,
+    operator.mul: np.multiply,
+    operator.floordiv: np.floor_divide,
+    operator.truediv: np.true_divide,
+    operator.mod: np.remainder,
+    operator.lshift: np.left_shift,
+    operator.rshift: np.right_shift,
+    operator.and_: np.bitwise_and,
+    operator.or_: np.bitwise_or,
+    operator.xor: np.bitwise_xor,
+    operator.pow: np.power,
+}
+
+# NumPy's integer versions of these don't raise errors (like dividing by zero)
+# the way Python's operators do, so they're always applied to Python ints.
+_OBJECT_UFUNCS = frozenset((np.floor_divide, np.true_divide, np.remainder, np.power))
+
+# NumPy ufuncs that apply each unary operator to whole arrays of sample values.
+_OP1_UFUNCS = {
+    operator.pos: np.positive,
+    operator.neg: np.negative,
+    operator.not_: np.logical_not,
+    operator.inv: np.invert,
+    operator.invert: np.invert,
+    operator.abs: np.absolute,
+}
+
 
 class Trace(list):
     """
@@ -41,6 +97,18 @@ class Trace(list):
     slope = 0.20  # trace transition slope as % of unit_time.
 
     trace_fields = ["line_fmt", "name_fmt", "data_fmt", "slope"]
+    _trace_fields_set = frozenset(trace_fields)
+
+    # Cached sample times and values and the last WaveJSON wave generated
+    # from them. These are checked when they're read and rebuilt if the samples
+    # were changed since then. Appending samples changes the trace length and
+    # any other change bumps the version, so append() can stay a bare list.append.
+    _times = None
+    _times_np = None
+    _values_np = None
+    _wavejson = None
+    _version = 0  # Count of (non-append) changes made to the samples.
+    _cache_key = None  # Version and length of the samples when cached.
 
     def __init__(self, *args, **kwargs):
         self.config(**kwargs)
@@ -60,12 +128,13 @@ class Trace(list):
             data_fmt (dict): https://matplotlib.org/3.2.1/api/text_api.html#matplotlib.text.Text
         """
         for k, v in kwargs.items():
-            if k not in cls.trace_fields:
+            if k not in cls._trace_fields_set:
                 continue
-            setattr(cls, k, copy(v))
+            # Only mutable values need copying; immutables can be shared.
+            setattr(cls, k, copy(v) if isinstance(v, (dict, list, set)) else v)
 
-        for k in cls.trace_fields:
-            kwargs.pop(k, None)  # Remove the keyword arg.
+        for k in cls._trace_fields_set & kwargs.keys():
+            kwargs.pop(k)  # Remove the keyword arg.
 
     def config(self, **kwargs):
         """
@@ -78,7 +147,7 @@ class Trace(list):
             data_fmt (dict): https://matplotlib.org/3.2.1/api/text_api.html#matplotlib.text.Text
         """
         for k, v in kwargs.items():
-            if k not in self.trace_fields:
+            if k not in self._trace_fields_set:
                 continue
             if isinstance(v, dict):
                 setattr(self, k, copy(getattr(self, k, {})))
@@ -87,10 +156,51 @@ class Trace(list):
                 except AttributeError:
                     setattr(self, k, {})
                     getattr(self, k).update(v)
-            else:
+            elif isinstance(v, (list, set)):
                 setattr(self, k, copy(v))
-        for k in self.trace_fields:
-            kwargs.pop(k, None)  # Remove the keyword arg.
+            else:
+                setattr(self, k, v)
+        for k in self._trace_fields_set & kwargs.keys():
+            kwargs.pop(k)  # Remove the keyword arg.
+
+    @classmethod
+    def _from_arrays(cls, times, values, like=None):
+        """
+        Return a Trace with samples built from arrays of times and values.
+        If a Trace is passed as like, its name and settings are copied.
+        """
+        if like is None:
+            trace = cls(map(Sample, times.tolist(), values.tolist()))
+        else:
+            trace = cls._empty_like(like)
+            trace.extend(map(Sample, times.tolist(), values.tolist()))
+
+        # Keep the arrays so later operations on the trace don't rebuild them.
+        # This also keeps the compact int8 values of binarized traces.
+        trace._check_cache()
+        trace._times_np = times
+        trace._values_np = values
+        return trace
+
+    @classmethod
+    def _empty_like(cls, src):
+        """Return a Trace with the name and settings of another but no samples."""
+        trace = cls.__new__(type(src))
+        trace.__dict__.update(src.__dict__)
+        trace._clear_cache()  # Drop cached samples.
+        return trace
+
+    def _clear_cache(self):
+        """Discard everything cached from the samples of the trace."""
+        self._times = self._times_np = self._values_np = self._wavejson = None
+        self._cache_key = None
+
+    def _check_cache(self):
+        """Discard anything cached if the samples have changed since it was cached."""
+        key = (self._version, len(self))
+        if key != self._cache_key:
+            self._clear_cache()
+            self._cache_key = key
 
     def store_sample(self, value, time):
         """Store a value and the current time into the trace."""
@@ -109,18 +219,36 @@ class Trace(list):
         """Return the time of the last sample in the trace."""
         return self[-1].time
 
+    def _get_times(self):
+        """Return the (cached) list of times of all the samples in the trace."""
+        self._check_cache()
+        if self._times is None:
+            self._times = [sample.time for sample in self]
+        return self._times
+
     def get_index(self, time):
         """Return the position to insert a sample with the given time."""
 
-        for i, sample in enumerate(self):
-            # Return the index of the 1st sample with a time GREATER than the
-            # given time because the sample will be inserted BEFORE that index.
-            if sample.time > time:
-                return i
-
-        # Didn't find a sample with a time greater than the given time, so
-        # the insertion point is the end of the trace list.
-        return len(self)
+        # Return the index of the 1st sample with a time GREATER than the
+        # given time because the sample will be inserted BEFORE that index.
+        return bisect_right(self._get_times(), time)
+
+    def _get_times_np(self):
+        """Return the (cached) array of times of all the samples in the trace."""
+        self._check_cache()
+        if self._times_np is None:
+            self._times_np = np.array(self._get_times())
+        return self._times_np
+
+    def _get_values_np(self):
+        """Return the (cached) array of values of all the samples in the trace."""
+        self._check_cache()
+        if self._values_np is None:
+            # Use an object array so values like intbv aren't unpacked into sequences.
+            self._values_np = np.fromiter(
+                (sample.value for sample in self), dtype=object, count=len(self)
+            )
+        return self._values_np
 
     def get_value(self, time):
         """Get the trace value at an arbitrary time."""
@@ -128,33 +256,37 @@ class Trace(list):
         # Return the signal value immediately BEFORE the insertion index.
         return self[max(0, self.get_index(time) - 1)].value
 
-    def get_disp_value(self, time, **kwargs):
-        """Get the displayed trace value at an arbitrary time."""
+    def _disp_fn(self, **kwargs):
+        """Return a function that converts a trace value into its displayed value."""
 
         # Get the function for displaying the trace's value, first from kwargs or else from trace data_fmt attr.
         data_fmt = kwargs.get("data_fmt", getattr(self, "data_fmt"))
         repr = data_fmt.get("repr", str)
 
-        val = self.get_value(time)
-        try:
-            return repr(val)
-        except (TypeError, ValueError):
-            return str(val)
+        def disp_fn(val):
+            try:
+                return repr(val)
+            except (TypeError, ValueError):
+                return str(val)
+
+        return disp_fn
+
+    def get_disp_value(self, time, **kwargs):
+        """Get the displayed trace value at an arbitrary time."""
+        return self._disp_fn(**kwargs)(self.get_value(time))
 
     def get_sample_times(self, **kwargs):
         """Return list of times at which the trace was sampled."""
         start_time = kwargs.pop("start_time", self.start_time())
         stop_time = kwargs.pop("stop_time", self.stop_time())
-        return [
-            sample.time for sample in self if start_time <= sample.time <= stop_time
-        ]
+        times = self._get_times()
+        return times[bisect_left(times, start_time) : bisect_right(times, stop_time)]
 
     def delay(self, delta):
         """Return the trace data shifted in time by delta units."""
-        delayed_trace = copy(self)
-        delayed_trace.clear()
-        delayed_trace.extend([Sample(t + delta, v) for t, v in self])
-        return delayed_trace
+        return Trace._from_arrays(
+            self._get_times_np() + delta, self._get_values_np(), like=self
+        )
 
     def extend_duration(self, start_time, end_time):
         """Extend the duration of a trace."""
@@ -167,22 +299,21 @@ class Trace(list):
 
     def collapse_time_repeats(self):
         """Return trace with samples having the same sampling time collapsed into a single sample."""
-        trace = copy(self)
-        trace.clear()
-
-        # Build the trace backwards, moving from the newest to the oldest sample.
+        # Gather the samples backwards, moving from the newest to the oldest sample.
         # Accept only samples having a time < the most recently accepted sample.
-        trace.append(self[-1])
-        for sample in self[-1::-1]:
-            if sample.time < trace[0].time:
-                trace.insert(0, sample)
-
+        samples = [self[-1]]
+        for sample in reversed(self):
+            if sample.time < samples[-1].time:
+                samples.append(sample)
+
+        # Store the samples in oldest-to-newest order in a single extension.
+        trace = Trace._empty_like(self)
+        trace.extend(reversed(samples))
         return trace
 
     def collapse_value_repeats(self):
         """Return trace with consecutive samples having the same value collapsed into a single sample."""
-        trace = copy(self)
-        trace.clear()
+        trace = Trace._empty_like(self)
 
         # Build the trace forwards, removing any samples with the same
         # value as the previous sample.
@@ -195,34 +326,69 @@ class Trace(list):
 
     def interpolate(self, times):
         """Insert interpolated values at the times in the given list."""
-        for time in times:
-            insert_sample(Sample(self.get_value(time), time))
+
+        # Find where each new sample goes and the trace value at that time.
+        times = np.sort(np.asarray(times), kind="stable")
+        indices = np.searchsorted(self._get_times_np(), times, side="right")
+        values = self._get_values_np()[np.maximum(indices - 1, 0)]
+
+        # Insert all the new samples in a single pass over the trace.
+        samples = np.fromiter(self, dtype=object, count=len(self))
+        new_samples = np.fromiter(
+            map(Sample, times.tolist(), values), dtype=object, count=len(times)
+        )
+        self[:] = np.insert(samples, indices, new_samples).tolist()
 
     def add_rise_fall(self, delta):
         """Add rise/fall time to trace transitions. Remove repeats before calling!"""
-        trace = copy(self)
-        prev_sample = trace[0]
-        for sample in trace[1:]:
-            # TODO: This causes a problem if sample.time - delta < prev_sample.time.
-            trace.insert_sample(Sample(sample.time - delta, prev_sample.value))
-            prev_sample = sample
-        return trace
+        times = self._get_times_np()
+        values = self._get_values_np()
+
+        # Interleave the samples with new samples placed delta before each
+        # transition that hold the value of the preceding sample.
+        new_times = np.empty(2 * len(times) - 1, dtype=np.result_type(times, delta))
+        new_times[0::2] = times
+        new_times[1::2] = times[1:] - delta
+        new_values = np.empty(len(new_times), dtype=object)
+        new_values[0::2] = values
+        new_values[1::2] = values[:-1]
+
+        # Put the new samples in time order, keeping samples with the same time
+        # in the order they were added.
+        # TODO: This causes a problem if sample.time - delta < prev_sample.time.
+        order = np.argsort(new_times, kind="stable")
+
+        return Trace._from_arrays(new_times[order], new_values[order], like=self)
 
     def add_slope(self):
         """Return a trace with slope added to trace transitions."""
-        slope = max(self.slope, 0.0001) * self.unit_time  # Don't let slope go to 0.
+        slope = max(self.slope, 0.0001) * _get_unit_time()  # Don't let slope go to 0.
         return self.add_rise_fall(slope).delay(slope / 2)
 
     def binarize(self):
         """Return trace of sample values set to 1 (if true) or 0 (if false)."""
-        return Trace([Sample(t, (v and 1) or 0) for t, v in self])
+        values = self._get_values_np().astype(bool).astype(np.int8)
+        return Trace._from_arrays(self._get_times_np(), values)
 
     def apply_op1(self, op_func):
         """Return trace generated by applying the operator function to all the sample values in the trace."""
-        return Trace([Sample(t, op_func(v)) for t, v in self])
+        ufunc = _OP1_UFUNCS.get(op_func) or np.frompyfunc(op_func, 1, 1)
+        return Trace._from_arrays(self._get_times_np(), ufunc(self._get_values_np()))
 
     def apply_op2(self, trc, op_func):
         """Return trace generated by applying the operator function to two traces."""
+        ufunc = _OP_UFUNCS.get(op_func) or np.frompyfunc(op_func, 2, 1)
+        return Trace._from_arrays(*self._apply_ufunc2(trc, ufunc))
+
+    def _compare(self, trc, ufunc):
+        """Return trace of 1 (if true) or 0 (if false) from comparing two traces with a ufunc."""
+
+        # The comparison results are binarized here instead of making another pass with binarize().
+        times, values = self._apply_ufunc2(trc, ufunc)
+        return Trace._from_arrays(times, values.astype(bool, copy=False).astype(np.int8))
+
+    def _apply_ufunc2(self, trc, ufunc):
+        """Return the merged sample times of two traces and the ufunc of their values at those times."""
 
         if isinstance(trc, Trace):
             pass
@@ -244,72 +410,41 @@ class Trace(list):
                 "Trace can only be combined with another Trace or a number."
             )
 
-        # Make copies of the traces since they will be altered.
-        trc1 = copy(self)
-        trc2 = copy(trc)
-
-        # Extend the traces so they start/end at the same time.
-        start_time = min(trc1[0].time, trc2[0].time)
-        end_time = max(trc1[-1].time, trc2[-1].time)
-        trc1.extend_duration(start_time, end_time)
-        trc2.extend_duration(start_time, end_time)
-
-        # Make a trace to hold the result generated by combining the two traces.
-        res_trc = Trace([])
-
-        # Loop through the trace samples, always using the earliest sample of the two.
-        indx1 = 0  # Index of current sample in trc1.
-        indx2 = 0  # Index of current sample in trc2.
-        while True:
-            # Find the earliest sample of the two traces and get the value
-            # of each trace at that time.
-            t1, v1 = trc1[indx1]
-            t2, v2 = trc2[indx2]
-            if t1 <= t2:
-                curr_time = t1
-            else:
-                curr_time = t2
-            v2 = trc2.get_value(curr_time)
-            v1 = trc1.get_value(curr_time)
-
-            # Combine the trace values using the operator.
-            res_trc_val = op_func(v1, v2)
+        # Merge the sample times of both traces. Traces are extended at either
+        # end with their first and last values so they cover the same times.
+        times1 = self._get_times_np()
+        times2 = trc._get_times_np()
+        times = np.union1d(times1, times2)
 
-            # Append result to the results trace.
-            res_trc.append(Sample(curr_time, res_trc_val))
+        # Get the value of each trace at (or just before) each merged time.
+        indices1 = np.maximum(np.searchsorted(times1, times, side="right") - 1, 0)
+        indices2 = np.maximum(np.searchsorted(times2, times, side="right") - 1, 0)
+        values1 = self._get_values_np()[indices1]
+        values2 = trc._get_values_np()[indices2]
+        if ufunc in _OBJECT_UFUNCS:
+            values1 = values1.astype(object, copy=False)
+            values2 = values2.astype(object, copy=False)
 
-            # Looped through all samples if each index is pointing to the
-            # last sample in their traces.
-            if indx1 == len(trc1) - 1 and indx2 == len(trc2) - 1:
-                break
-
-            # Move to next sample after the current time. (Might need to
-            # increment both traces if they both had samples at the current time.)
-            if t1 == curr_time:
-                indx1 += 1
-            if t2 == curr_time:
-                indx2 += 1
-
-        # Return trace containing the result of the operation.
-        return res_trc
+        # Combine the trace values using the ufunc in a single call.
+        return times, ufunc(values1, values2)
 
     def __eq__(self, trc):
-        return self.apply_op2(trc, operator.eq).binarize()
+        return self._compare(trc, np.equal)
 
     def __ne__(self, trc):
-        return self.apply_op2(trc, operator.ne).binarize()
+        return self._compare(trc, np.not_equal)
 
     def __le__(self, trc):
-        return self.apply_op2(trc, operator.le).binarize()
+        return self._compare(trc, np.less_equal)
 
     def __ge__(self, trc):
-        return self.apply_op2(trc, operator.ge).binarize()
+        return self._compare(trc, np.greater_equal)
 
     def __lt__(self, trc):
-        return self.apply_op2(trc, operator.lt).binarize()
+        return self._compare(trc, np.less)
 
     def __gt__(self, trc):
-        return self.apply_op2(trc, operator.gt).binarize()
+        return self._compare(trc, np.greater)
 
     def __add__(self, trc):
         return self.apply_op2(trc, operator.add)
@@ -365,18 +500,37 @@ class Trace(list):
     def __abs__(self):
         return self.apply_op1(operator.abs)
 
+    def _compare_delayed(self, op_func):
+        """Return binarized trace of op_func applied to the trace and the trace delayed by one unit time."""
+
+        # Same as combining the trace with self.delay(unit_time), but done in
+        # one pass without building the delayed trace or its intermediates.
+        times = self._get_times_np()
+        delayed_times = times + _get_unit_time()
+        all_times = np.union1d(times, delayed_times)
+        values = self._get_values_np()
+        curr = values[np.maximum(np.searchsorted(times, all_times, side="right") - 1, 0)]
+        prev = values[
+            np.maximum(np.searchsorted(delayed_times, all_times, side="right") - 1, 0)
+        ]
+
+        # The results are binarized here instead of making another trace with binarize().
+        values = op_func(curr, prev).astype(bool, copy=False).astype(np.int8)
+        return Trace._from_arrays(all_times, values)
+
     def anyedge(self):
-        return (self != self.delay(self.unit_time)).binarize()
+        return self._compare_delayed(np.not_equal)
 
     def posedge(self):
-        return (self & (~self.delay(self.unit_time))).binarize()
+        return self._compare_delayed(lambda curr, prev: curr & ~prev)
 
     def negedge(self):
-        return ((~self) & self.delay(self.unit_time)).binarize()
+        return self._compare_delayed(lambda curr, prev: ~curr & prev)
 
     def trig_times(self):
         """Return list of times trace value is true (non-zero)."""
-        return [sample.time for sample in self if sample.value]
+        times = self._get_times()
+        return [times[i] for i in np.flatnonzero(self._get_values_np().astype(bool))]
 
     def to_matplotlib(self, subplot, start_time, stop_time, xlim=None, **kwargs):
         """Fill a matplotlib subplot for a trace between the start & stop times."""
@@ -428,9 +582,6 @@ class Trace(list):
         if trace.num_bits > 1:
             # Multi-bit bus trace.
 
-            # Get the function for displaying the bus value.
-            repr = trace.data_fmt.get("repr", str)
-
             # Copy data format with repr function removed because matplotlib won't like it.
             data_fmt = copy(trace.data_fmt)
             data_fmt.pop("repr", None)
@@ -438,34 +589,29 @@ class Trace(list):
             # Get list of times the bus changes values.
             chg_times = [sample.time for sample in trace]
 
+            # Find the span of each bus packet clipped to the start/stop times
+            # and keep only the packets that are still visible.
+            chg_times_np = trace._get_times_np()
+            times0 = np.maximum(chg_times_np[:-1], start_time)
+            times1 = np.minimum(chg_times_np[1:], stop_time)
+            visible = times1 > times0
+            times0 = times0[visible]
+            times1 = times1[visible]
+
             # Print bus values at midpoints of the bus packets.
-            time0 = chg_times[0]
-            for time1 in chg_times[1:]:
-                if time0 < start_time:
-                    time0 = start_time
-                if time1 <= time0:
-                    time0 = time1
-                    continue
-                if time1 > stop_time:
-                    time1 = stop_time
-                val = trace.get_disp_value(time0, **kwargs)
-                text_x = (time1 + time0) / 2
-                text_y = 0.5
+            vals = _get_disp_values(trace, times0, **kwargs)
+            for text_x, val in zip(((times0 + times1) / 2).tolist(), vals):
                 subplot.text(
                     text_x,
-                    text_y,
+                    0.5,
                     val,
                     horizontalalignment="center",
                     verticalalignment="center",
                     **data_fmt  # Use local data_fmt dict with repr removed.
                 )
-                time0 = time1
-                if time0 >= stop_time:
-                    break
 
             # Create a binary trace that toggles whenever the bus trace changes values.
-            tgl_trace = copy(trace)
-            tgl_trace.clear()
+            tgl_trace = Trace._empty_like(trace)
             value = 0
             for time in chg_times:
                 tgl_trace.store_sample(value, time)
@@ -478,88 +624,95 @@ class Trace(list):
             bar_trace = tgl_trace.__not__()
 
             # Plot the trace packets.
-            x = [sample.time for sample in tgl_trace]
-            y = [sample.value for sample in tgl_trace]
-            y_bar = [sample.value for sample in bar_trace]
+            x = tgl_trace._get_times_np()
+            y = tgl_trace._get_values_np()
+            y_bar = bar_trace._get_values_np()
             if isinstance(trace.line_fmt, dict):
-                subplot.plot(x, y, x, y_bar, **trace.line_fmt)
+                lines = subplot.plot(x, y, x, y_bar, **trace.line_fmt)
             else:
-                subplot.plot(x, y, trace.line_fmt, x, y_bar, trace.line_fmt)
+                lines = subplot.plot(x, y, trace.line_fmt, x, y_bar, trace.line_fmt)
 
         else:
             # Binary trace.
             trace = trace.add_slope()
-            x = [sample.time for sample in trace]
-            y = [sample.value for sample in trace]
+            x = trace._get_times_np()
+            y = trace._get_values_np()
             if isinstance(trace.line_fmt, dict):
-                subplot.plot(x, y, **trace.line_fmt)
+                lines = subplot.plot(x, y, **trace.line_fmt)
             else:
-                subplot.plot(x, y, trace.line_fmt)
+                lines = subplot.plot(x, y, trace.line_fmt)
+
+        # Draw the waveform as a bitmap within vector (SVG/PDF) output if requested.
+        if kwargs.get("rasterized"):
+            for line in lines:
+                line.set_rasterized(True)
 
     def to_wavejson(self, start_time, stop_time):
         """Generate the WaveJSON data for a trace between the start & stop times."""
 
-        has_samples = False  # No samples currently on the wave.
-        wave_str = ""  # No samples, so wave string is empty.
-        wave_data = list()  # No samples, so wave data values are empty.
-        prev_time = start_time  # Set time of previous sample to the wave starting time.
-        prev_val = None  # Value of previous sample starts at non-number.
-
-        # Save the current state of the waveform.
-        prev = [has_samples, wave_str, copy(wave_data), prev_time, prev_val]
-
-        # Insert samples into a copy of the waveform data. These samples bound
-        # the beginning and ending times of the waveform.
-        bounded_samples = copy(self)
-        bounded_samples.insert_sample(Sample(start_time, self.get_value(start_time)))
-        bounded_samples.insert_sample(Sample(stop_time, self.get_value(stop_time)))
-
-        # Create the waveform by processing the waveform data.
-        for time, val in bounded_samples:
-
-            # Skip samples before the desired start of the time window.
-            if time < start_time:
-                continue
-
-            # Exit the loop if the current sample occurred after the time window.
-            if time > stop_time:
-                break
-
-            # If a sample occurred at the same time as the previous sample,
-            # then revert back to the previous waveform to remove the previous
-            # sample and put this new sample in its place.
-            if time == prev_time:
-                has_samples, wave_str, wave_data, prev_time, prev_val = prev
-
-            # Save the current waveform in case a back-up is needed.
-            prev = [has_samples, wave_str, copy(wave_data), prev_time, prev_val]
-
-            # If the current sample occurred after the desired time window,
-            # then just extend the previous sample up to the end of the window.
-            if time > stop_time:
-                val = prev_val  # Use the value of the previous sample.
-                time = stop_time  # Extend it to the end of the window.
+        # Reuse the last wave if it was made for the same window and display settings.
+        key = (start_time, stop_time, _get_unit_time(), self.name, self.num_bits)
+        self._check_cache()
+        if self._wavejson is None or self._wavejson[0] != key:
+            self._wavejson = (key, self._make_wavejson(start_time, stop_time))
+        wave = dict(self._wavejson[1])
+        if "data" in wave:
+            wave["data"] = list(wave["data"])  # Don't let callers alter the cached data.
+        return wave
 
-            # Replicate the sample's previous value up to the current time.
-            wave_str += "." * (round((time - prev_time) / self.unit_time) - 1)
+    def _make_wavejson(self, start_time, stop_time):
+        """Generate the WaveJSON data for a trace between the start & stop times."""
 
-            # Add the current sample's value to the waveform.
+        # Keep only the samples within the time window and bound them with
+        # samples holding the trace values at the start & stop times.
+        times = self._get_times_np()
+        values = self._get_values_np()
+        lo = np.searchsorted(times, start_time, side="right")
+        hi = np.searchsorted(times, stop_time, side="left")
+        end = np.searchsorted(times, stop_time, side="right")
+        bounded_values = np.empty(max(hi - lo, 0) + 2, dtype=object)
+        bounded_values[0] = values[max(lo - 1, 0)]
+        bounded_values[1:-1] = values[lo:hi]
+        bounded_values[-1] = values[max(end - 1, 0)]
+        times = np.concatenate(([start_time], times[lo:hi], [stop_time]))
+        values = bounded_values
+
+        # If several samples occurred at the same time, only the last one is shown.
+        last = np.append(times[1:] != times[:-1], True)
+        times = times[last]
+        values = values[last]
+
+        # Get the number of unit times each sample's previous value is replicated
+        # before the sample, starting from the beginning of the time window.
+        gaps = np.diff(times, prepend=start_time) / _get_unit_time()
+        gaps = np.round(gaps).astype(int) - 1
+
+        # Only samples that change the value get a symbol on the wave. All the
+        # other wave positions just extend the previous value with a '.'.
+        changed = np.ones(len(values), dtype=bool)
+        changed[1:] = values[1:] != values[:-1]
+        changed_values = values[changed]
+
+        # Find the wave position of each changed sample's symbol and the number
+        # of '.' preceding it. Then only the changed samples are visited.
+        ends = np.cumsum(np.maximum(gaps, 0) + 1)
+        positions = ends[changed] - 1
+        num_dots = np.diff(positions, prepend=-1) - 1
+        trailing_dots = ends[-1] - 1 - positions[-1]
+
+        if self.num_bits > 1:
+            # Values will be shown in data "envelopes".
+            symbols = ["="] * len(changed_values)
+            wave_data = [str(val) for val in changed_values]
+        else:
+            # Binary (hi/lo) waveform.
+            symbols = [str(val * 1) for val in changed_values]  # '1' or '0'.
+            wave_data = list()
 
-            if has_samples and (val == prev_val):
-                # Just extend the previous sample if the current sample has the same value.
-                wave_str += "."
-            else:
-                if self.num_bits > 1:
-                    # Value will be shown in a data "envelope".
-                    wave_str += "="
-                    wave_data.append(str(val))
-                else:
-                    # Binary (hi/lo) waveform.
-                    wave_str += str(val * 1)  # Turn value into '1' or '0'.
-
-            has_samples = True  # The waveform now contains samples.
-            prev_time = time  # Save the time and value of the
-            prev_val = val  #   sample that was just added to the waveform.
+        wave_str = "".join(
+            "." * dots + symbol for dots, symbol in zip(num_dots.tolist(), symbols)
+        )
+        wave_str += "." * trailing_dots.item()
 
         # Return a dictionary with the wave in a format that WaveDrom understands.
         wave = dict()
@@ -570,6 +723,36 @@ class Trace(list):
         return wave
 
 
+def _invalidates_cache(method):
+    """Wrap a list method so calling it makes the cached sample times and values stale."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._version += 1
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+# Any list method that alters the samples must mark the cached samples as stale.
+# append() is left alone because it's called for every recorded sample, and
+# the length change it makes is enough to tell that the cache is stale.
+for _method in (
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+):
+    setattr(Trace, _method, _invalidates_cache(getattr(list, _method)))
+
+
 ###############################################################################
 # Functions for handling multiple traces follow...
 ###############################################################################
@@ -577,14 +760,25 @@ class Trace(list):
 
 def calc_unit_time(*traces):
     """Calculate and return the unit time between trace samples."""
-    intervals = Counter()
+    intervals = []
     for trace in traces:
-        times = sorted(
-            trace.collapse_time_repeats().collapse_value_repeats().get_sample_times()
-        )
-        intervals.update([t[1] - t[0] for t in zip(times[:-1], times[1:])])
-    most_common_interval = intervals.most_common(1)[0][0]
-    min_interval = min(intervals.keys())
+        # Keep the last sample at each time and then drop samples that don't
+        # change the trace value. The intervals are the times between changes.
+        times = trace._get_times_np()
+        values = trace._get_values_np()
+        last = np.append(times[1:] != times[:-1], True)
+        times = times[last]
+        values = values[last]
+        changed = np.insert(values[1:] != values[:-1], 0, True).astype(bool)
+        intervals.append(np.diff(times[changed]))
+
+    # Find the most common interval. Ties go to the interval seen first.
+    intervals, first_seen, counts = np.unique(
+        np.concatenate(intervals), return_index=True, return_counts=True
+    )
+    most_common = np.flatnonzero(counts == counts.max())
+    most_common_interval = intervals[most_common[first_seen[most_common].argmin()]]
+    min_interval = intervals[0].item()
     ratio = most_common_interval / min_interval
     if math.isclose(round(ratio), ratio, abs_tol=0.01):
         return min_interval
@@ -594,35 +788,59 @@ def calc_unit_time(*traces):
     )
 
 
+def _get_time_bounds(traces, start_time=None, stop_time=None):
+    """Return the start & stop times, filling in any that are None from the span of the traces."""
+    if start_time is None or stop_time is None:
+        # Get the start and stop times of the traces in a single pass.
+        starts, stops = zip(
+            *[
+                (trace.start_time(), trace.stop_time())
+                for trace in traces
+                if isinstance(trace, Trace)
+            ]
+        )
+        if start_time is None:
+            start_time = min(starts)
+        if stop_time is None:
+            stop_time = max(stops)
+    return start_time, stop_time
+
+
 def _get_sample_times(*traces, **kwargs):
     """Get sample times for all the traces."""
 
     # Set the time boundaries for the DataFrame.
-    max_stop_time = max(
-        [trace.stop_time() for trace in traces if isinstance(trace, Trace)]
+    start_time, stop_time = _get_time_bounds(
+        traces, kwargs.pop("start_time", None), kwargs.pop("stop_time", None)
     )
-    stop_time = kwargs.pop("stop_time", max_stop_time)
-    min_start_time = min(
-        [trace.start_time() for trace in traces if isinstance(trace, Trace)]
-    )
-    start_time = kwargs.pop("start_time", min_start_time)
 
     # Get all the sample times of all the traces between the start and stop times.
-    times = set([start_time, stop_time])
+    times = [np.array([start_time, stop_time])]
     for trace in traces:
-        times.update(
-            set(trace.get_sample_times(start_time=start_time, stop_time=stop_time))
-        )
+        trace_times = trace._get_times_np()
+        lo = np.searchsorted(trace_times, start_time, side="left")
+        hi = np.searchsorted(trace_times, stop_time, side="right")
+        times.append(trace_times[lo:hi])
 
     # If requested, fill in additional times between sample times.
     step = kwargs.pop("step", 0)
     if step:
-        times.update(set(range(start_time, stop_time + 1, step)))
+        times.append(np.arange(start_time, stop_time + 1, step))
+
+    # Merge the sample times into a single sorted list without repeats.
+    return np.unique(np.concatenate(times)).tolist()
+
 
-    # Sort sample times in increasing order.
-    times = sorted(list(times))
+def _get_disp_values(trace, times, **kwargs):
+    """Return the displayed values of a trace at each of the given times."""
 
-    return times
+    # Gather the value at or before each time with one search over the sample times.
+    indices = np.searchsorted(trace._get_times_np(), times, side="right") - 1
+    values = trace._get_values_np()[np.maximum(indices, 0)]
+
+    # Convert the values using the display function looked up once for the trace.
+    disp_fn = trace._disp_fn(**kwargs)
+    return np.fromiter(map(disp_fn, values), dtype=object, count=len(values))
 
 
 def traces_to_dataframe(*traces, **kwargs):
@@ -649,13 +867,18 @@ def traces_to_dataframe(*traces, **kwargs):
     # Get sample times.
     times = _get_sample_times(*traces, **kwargs)
 
-    # Create dict of trace sample lists.
-    trace_data = {
-        tr.name: [tr.get_disp_value(t, **kwargs) for t in times] for tr in traces
-    }
+    # Fill a block of displayed values where each column holds a trace.
+    trace_data = np.empty((len(times), len(traces)), dtype=object)
+    for col, tr in enumerate(traces):
+        trace_data[:, col] = _get_disp_values(tr, times, **kwargs)
 
     # Return a DataFrame where each column is a trace and time is the index.
-    return pd.DataFrame(trace_data, index=times)
+    return pd.DataFrame(
+        trace_data,
+        index=np.asarray(times),
+        columns=[tr.name for tr in traces],
+        copy=False,
+    )
 
 
 def traces_to_table_data(*traces, **kwargs):
@@ -684,11 +907,8 @@ def traces_to_table_data(*traces, **kwargs):
 
     # Create a table from lines of data where the first element in each row
     # is the sample time and the following elements are the trace values.
-    table_data = list()
-    for time in times:
-        row = [trace.get_disp_value(time, **kwargs) for trace in traces]
-        row.insert(0, time)
-        table_data.append(row)
+    columns = [_get_disp_values(trace, times, **kwargs) for trace in traces]
+    table_data = [list(row) for row in zip(times, *columns)]
     headers = ["Time"] + [trace.name for trace in traces]
     return table_data, headers
 
@@ -700,14 +920,18 @@ def traces_to_table(*traces, **kwargs):
 
 
 def traces_to_text_table(*traces, **kwargs):
-    if "format" not in kwargs:
-        kwargs["format"] = "simple"
-    print(traces_to_table(*traces, **kwargs))
+    format = kwargs.pop("format", "simple")
+    table_data, headers = traces_to_table_data(*traces, **kwargs)
+    print(tabulate(tabular_data=table_data, headers=headers, tablefmt=format))
 
 
 def traces_to_html_table(*traces, **kwargs):
-    kwargs["format"] = "html"
-    tbl_html = traces_to_table(*traces, **kwargs)
+    import IPython.display as DISP
+
+    # Let pandas build the HTML instead of formatting the table row-by-row.
+    kwargs.pop("format", None)
+    df = traces_to_dataframe(*traces, **kwargs)
+    tbl_html = df.rename_axis("Time").reset_index().to_html(index=False)
 
     # Generate the HTML from the JSON.
     DISP.display_html(DISP.HTML(tbl_html))
@@ -720,6 +944,25 @@ def _interpolate_traces(*traces, times):
         trace.interpolate(times)
 
 
+# Figures and axes kept for reuse by traces_to_matplotlib(..., reuse=True).
+_FIG_CACHE = dict()
+
+
+def close_fig():
+    """Close and forget the figures kept for reuse by traces_to_matplotlib."""
+    import matplotlib.pyplot as plt
+
+    for fig, _ in _FIG_CACHE.values():
+        plt.close(fig)
+    _FIG_CACHE.clear()
+
+
+@functools.lru_cache(maxsize=16)
+def _tick_labels(start, stop):
+    """Return the labels for the cycles from start up to stop."""
+    return tuple(map(str, range(start, stop)))
+
+
 def traces_to_matplotlib(*traces, **kwargs):
     """
     Display waveforms stored in peekers in Jupyter notebook using matplotlib.
@@ -741,23 +984,38 @@ def traces_to_matplotlib(*traces, **kwargs):
             time_fmt (dict): https://matplotlib.org/3.2.1/api/text_api.html#matplotlib.text.Text
             width: The width of the waveform display in inches.
             height: The height of the waveform display in inches.
+            save_only: If true, draw on a non-interactive Agg canvas that isn't
+                managed by pyplot. Use this when the figure will only be saved.
+            reuse: If true, clear and redraw a figure kept from an earlier call
+                with the same number of traces and size instead of making a
+                new one. Call close_fig() to release the kept figures.
+            rasterized: If true, draw the waveforms as bitmaps when saving to
+                vector formats like SVG or PDF. This shrinks files for long traces.
 
         Returns:
-            Figure and axes created by matplotlib.pyplot.subplots.
+            The matplotlib Figure and a NumPy array of its Axes, one per trace
+            from top to bottom, with all the Axes sharing the time axis. The
+            Figure comes from matplotlib.pyplot.figure, or is a bare Agg Figure
+            not managed by pyplot if save_only is true. If reuse is true, the
+            Figure and Axes may be ones returned by an earlier call. They're
+            redrawn by later calls with the same number of traces and size
+            until close_fig() is called.
     """
 
+    # Matplotlib is only imported when a waveform is actually plotted.
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FixedFormatter, FixedLocator, NullFormatter
+
+    unit_time = _get_unit_time()
     num_traces = len(traces)
     trace_hgt = 0.5  # Default trace height in inches.
     cycle_wid = 0.5  # Default unit cycle width in inches.
 
     # Handle keyword args explicitly for Python 2 compatibility.
-    start_time = kwargs.pop(
-        "start_time",
-        min([trace.start_time() for trace in traces if isinstance(trace, Trace)]),
-    )
-    stop_time = kwargs.pop(
-        "stop_time",
-        max([trace.stop_time() for trace in traces if isinstance(trace, Trace)]),
+    start_time, stop_time = _get_time_bounds(
+        traces, kwargs.pop("start_time", None), kwargs.pop("stop_time", None)
     )
     title = kwargs.pop("title", "")
     title_fmt = {"fontweight": "bold"}
@@ -771,20 +1029,40 @@ def traces_to_matplotlib(*traces, **kwargs):
     grid_fmt.update(kwargs.pop("grid_fmt", {}))
     time_fmt = {}
     time_fmt.update(kwargs.pop("time_fmt", {}))
-    width = kwargs.pop("width", (stop_time - start_time) / Trace.unit_time * cycle_wid)
+    width = kwargs.pop("width", (stop_time - start_time) / unit_time * cycle_wid)
     height = kwargs.pop("height", num_traces * trace_hgt)
+    save_only = kwargs.pop("save_only", False)
+    reuse = kwargs.pop("reuse", False)
 
-    # Create separate plot traces for each selected waveform.
+    # Create separate plot traces for each selected waveform. Each trace is
+    # placed within the stack of traces by the rectangle it's created with.
     trace_hgt_pctg = 1.0 / num_traces
-    fig, axes = plt.subplots(
-        nrows=num_traces,
-        sharex=True,
-        squeeze=False,
-        subplot_kw=None,
-        gridspec_kw=None,
-        figsize=(width, height),
-    )
-    axes = axes[:, 0]  # Collapse 2D matrix of subplots into a 1D list.
+    rects = np.empty((num_traces, 4))
+    rects[:, 0] = 0.1
+    rects[:, 1] = (num_traces - np.arange(1, num_traces + 1)) * trace_hgt_pctg
+    rects[:, 2] = 0.8
+    rects[:, 3] = trace_hgt_pctg
+    fig_key = (num_traces, width, height, save_only)
+    if reuse and fig_key in _FIG_CACHE:
+        # Clear the axes of a kept figure and draw on them again.
+        fig, axes = _FIG_CACHE[fig_key]
+        for axis in axes:
+            axis.cla()
+    else:
+        if save_only:
+            # Skip pyplot and the GUI backend and render straight to an Agg canvas.
+            fig = Figure(figsize=(width, height))
+            FigureCanvasAgg(fig)
+        else:
+            fig = plt.figure(figsize=(width, height))
+        axes = np.empty(num_traces, dtype=object)
+        for i, rect in enumerate(rects):
+            axes[i] = fig.add_axes(rect, sharex=axes[0] if i else None)
+            if i < num_traces - 1:
+                # Only the bottom trace shows time labels.
+                axes[i].xaxis.set_tick_params(which="both", labelbottom=False)
+        if reuse:
+            _FIG_CACHE[fig_key] = fig, axes
 
     # Render the figure canvas to get accurate text extents.
     fig.canvas.draw()
@@ -810,54 +1088,51 @@ def traces_to_matplotlib(*traces, **kwargs):
     axes[0].set_title(title, **title_fmt)
 
     # Set X-axis ticks at the bottom of the stack of traces.
-    start = math.floor(start_time / Trace.unit_time)
-    stop = math.ceil(stop_time / Trace.unit_time)
+    start = math.floor(start_time / unit_time)
+    stop = math.ceil(stop_time / unit_time)
     axes[-1].tick_params(axis="x", length=0, which="both")  # No tick marks.
     # Set positions of tick marks so grid lines will work.
-    axes[-1].set_xticks(
-        [x * Trace.unit_time for x in range(start, stop + 1)], minor=False
-    )
-    axes[-1].set_xticks(
-        [(x + 0.5) * Trace.unit_time for x in range(start, stop)], minor=True
-    )
+    # Locators are set directly to skip the extra bookkeeping done by set_xticks().
+    xaxis = axes[-1].xaxis
+    cycles = np.arange(start, stop + 1, dtype=np.float64)
+    xaxis.set_major_locator(FixedLocator(cycles * unit_time))
+    xaxis.set_minor_locator(FixedLocator((cycles[:-1] + 0.5) * unit_time))
     # Place cycle times at tick marks or between them.
     if not tick:
-        axes[-1].set_xticklabels([], minor=False, **time_fmt)
+        xaxis.set_major_formatter(NullFormatter())
+        if time_fmt:
+            plt.setp(xaxis.get_ticklabels(minor=False), **time_fmt)
     if tock:
-        axes[-1].set_xticklabels(
-            [str(x) for x in range(start, stop)], minor=True, **time_fmt
-        )
+        xaxis.set_minor_formatter(FixedFormatter(_tick_labels(start, stop)))
+        if time_fmt:
+            plt.setp(xaxis.get_ticklabels(minor=True), **time_fmt)
 
     # Adjust the limits of the X axis so the grid doesn't get chopped-off and
     # produce artifacts if a grid line is at the right or left edge.
-    bbox = axes[-1].get_window_extent().transformed(fig.dpi_scale_trans.inverted())
-    width_in_pixels = bbox.width * fig.dpi
+    # The traces are 80% of the figure width (see the axes rectangles above).
+    width_in_pixels = fig.get_figwidth() * fig.dpi * 0.8
     time_per_pixel = (stop_time - start_time) / width_in_pixels
     xlim = (start_time - time_per_pixel, stop_time + time_per_pixel)
 
-    # Plot each trace waveform.
-    for i, (trace, axis) in enumerate(zip(traces, axes), 1):
-
-        # Set position of trace within stacked traces.
-        axis.set_position([0.1, (num_traces - i) * trace_hgt_pctg, 0.8, trace_hgt_pctg])
-
-        # Place grid on X axis.
+    # Place grid on X axis of each trace.
+    for axis in axes:
         axis.grid(axis="x", **grid_fmt)
 
-        if not trace:
-            # Leave a blank space for non-traces.
-            # Remove ticks from Y axis.
-            axis.set_yticks([])
+    # Leave a blank space for non-traces.
+    blank_axes = [axis for trace, axis in zip(traces, axes) if not trace]
+    if blank_axes:
+        # Remove ticks from Y axis.
+        plt.setp(blank_axes, yticks=[])
+        for axis in blank_axes:
             axis.tick_params(axis="y", length=0, which="both")
 
-            # Remove the box around the subplot.
-            axis.spines["left"].set_visible(False)
-            axis.spines["right"].set_visible(False)
-            axis.spines["top"].set_visible(False)
-            axis.spines["bottom"].set_visible(False)
+        # Remove the box around the subplots.
+        sides = ("left", "right", "top", "bottom")
+        plt.setp([axis.spines[side] for axis in blank_axes for side in sides], visible=False)
 
-
-        else:
+    # Plot each trace waveform.
+    for trace, axis in zip(traces, axes):
+        if trace:
             trace.to_matplotlib(axis, start_time, stop_time, xlim, **kwargs)
 
             # Align the y-axis label to the right
@@ -874,6 +1149,31 @@ def traces_to_matplotlib(*traces, **kwargs):
     return fig, axes
 
 
+# Script that fetches the WaveDrom library and skin only if the page hasn't
+# already loaded them and then draws all the waveforms on the page.
+_WAVEDROM_LOADER = """
+(function (skin) {
+    function load(src, loaded, done) {
+        if (loaded()) {
+            done();
+            return;
+        }
+        var script = document.createElement("script");
+        script.src = src;
+        script.onload = done;
+        document.head.appendChild(script);
+    }
+    load("https://wavedrom.com/wavedrom.min.js",
+        function () { return window.WaveDrom; },
+        function () {
+            load("https://wavedrom.com/skins/" + skin + ".js",
+                function () { return window.WaveSkin && window.WaveSkin[skin]; },
+                function () { WaveDrom.ProcessAll(); });
+        });
+})(%s);
+"""
+
+
 def wavejson_to_wavedrom(wavejson, width=None, skin="default"):
     """
     Create WaveDrom display from WaveJSON data.
@@ -887,29 +1187,22 @@ def wavejson_to_wavedrom(wavejson, width=None, skin="default"):
       skin:  Selects the set of graphic elements used to draw the waveforms.
              Allowable values are 'default' and 'narrow'.
     """
+    import IPython.display as DISP
 
     # Set the width of the waveform display.
     style = ""
-    if width != None:
-        style = ' style="width: {w}px"'.format(w=str(int(width)))
-
-    # Generate the HTML from the JSON.
-    htmldata = '<div{style}><script type="WaveDrom">{json}</script></div>'.format(
-        style=style, json=json.dumps(wavejson)
+    if width is not None:
+        style = f' style="width: {int(width)}px"'
+
+    # Generate the HTML from the JSON. The script that loads WaveDrom and
+    # triggers the graphical display goes in the same HTML so it all reaches
+    # the notebook in a single display message.
+    htmldata = (
+        f'<div{style}><script type="WaveDrom">{_json_dumps(wavejson)}</script></div>'
+        f'<script type="text/javascript">{_WAVEDROM_LOADER % json.dumps(skin)}</script>'
     )
     DISP.display_html(DISP.HTML(htmldata))
 
-    # Trigger the WaveDrom Javascript that creates the graphical display.
-    DISP.display_javascript(
-        DISP.Javascript(
-            data="WaveDrom.ProcessAll();",
-            lib=[
-                "https://wavedrom.com/wavedrom.min.js",
-                "https://wavedrom.com/skins/{skin}.js".format(skin=skin),
-            ],
-        )
-    )
-
     # The following allows the display of WaveDROM in the HTML files generated by nbconvert.
     # It's disabled because it makes Github's nbconvert freak out.
     setup = """
@@ -947,13 +1240,8 @@ def traces_to_wavejson(*traces, **kwargs):
     tick = kwargs.get("tick", False)
     caption = kwargs.get("caption")
     title = kwargs.get("title")
-    stop_time = kwargs.get(
-        "stop_time",
-        max([trace.stop_time() for trace in traces if isinstance(trace, Trace)]),
-    )
-    start_time = kwargs.get(
-        "start_time",
-        min([trace.start_time() for trace in traces if isinstance(trace, Trace)]),
+    start_time, stop_time = _get_time_bounds(
+        traces, kwargs.get("start_time"), kwargs.get("stop_time")
     )
 
     wavejson = dict()
@@ -966,7 +1254,7 @@ def traces_to_wavejson(*traces, **kwargs):
             wavejson["signal"].append(dict())
 
     # Integer start time for calculating tick/tock values.
-    int_start_time = round(start_time / Trace.unit_time)
+    int_start_time = round(start_time / _get_unit_time())
 
     # Create a header for the set of waveforms.
     if title or tick or tock:
@@ -32,16 +32,26 @@ requirements = [
     "amaranth",
     "tabulate",
     "pandas",
-    "nbwavedrom",
-    "IPython",
-    "jupyterlab",
-    "nbconvert",
-    "nbformat",
-    "matplotlib",
+    "numpy",
 ]
 
 
 
+extra_requirements = {
+    # Packages for displaying waveforms in Jupyter notebooks. They're only
+    # imported when a waveform is drawn.
+    "notebook": [
+        "nbwavedrom",
+        "IPython",
+        "jupyterlab",
+        "nbconvert",
+        "nbformat",
+        "matplotlib",
+    ],
+    # Optional packages that speed up some operations if they're installed.
+    "fast": ["orjson"],
+}
+
 test_requirements = [
     # Put package test requirements here
     "pytest",
@@ -63,6 +73,7 @@ setup(
     package_data={"myhdlpeek": ["*.gif", "*.png"]},
     scripts=[],
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="MIT",
     zip_safe=False,
     keywords="myhdlpeek",
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_peeker
+----------------------------------
+
+Tests for the `Peeker` class.
+"""
+
+import unittest
+
+from myhdl import Signal, intbv
+
+from myhdlpeek import Peeker
+from myhdlpeek.trace import Sample, Trace
+
+
+def _peeker(name, samples):
+    """Return a Peeker whose trace holds the given (time, value) samples."""
+    peeker = Peeker(Signal(intbv(0)[4:]), name)
+    for time, value in samples:
+        peeker.trace.store_sample(value, time)
+    return peeker
+
+
+class TestPeekerTimes(unittest.TestCase):
+
+    def setUp(self):
+        Peeker.clear()
+
+    def tearDown(self):
+        Peeker.clear()
+
+    def test_start_stop_times(self):
+        # The earliest start and latest stop come from different peekers.
+        _peeker("a", [(2, 0), (5, 1)])
+        _peeker("b", [(3, 1), (9, 0)])
+        self.assertEqual(Peeker.start_time(), 2)
+        self.assertEqual(Peeker.stop_time(), 9)
+
+
+class TestPeekerNames(unittest.TestCase):
+
+    def setUp(self):
+        Peeker.clear()
+        _peeker("a", [(0, 1), (2, 3)])
+        _peeker("b", [(0, 2), (1, 4)])
+
+    def tearDown(self):
+        Peeker.clear()
+
+    def test_repeated_names_processed_once(self):
+        # A repeated peeker name, whether in one string or separate ones, gets one column.
+        table_data, headers = Peeker.to_table_data("a b a", "b")
+        self.assertEqual(headers, ["Time", "a", "b"])
+        self.assertEqual(table_data, [[0, "1", "2"], [1, "1", "4"], [2, "3", "4"]])
+        df = Peeker.to_dataframe("b a b")
+        self.assertEqual(list(df.columns), ["b", "a"])
+
+
+class TestPeekerConfig(unittest.TestCase):
+
+    def setUp(self):
+        Peeker.clear()
+
+    def tearDown(self):
+        Peeker.clear()
+        for k in ("foo", "opts"):
+            if k in vars(Peeker):
+                delattr(Peeker, k)
+
+    def test_config_overrides_defaults(self):
+        # Options set on a Peeker override the defaults, and dict options are merged.
+        Peeker.config_defaults(foo=1, opts={"a": 1})
+        p = _peeker("a", [(0, 1)])
+        p.config(foo=2, opts={"b": 2})
+        self.assertEqual(p.foo, 2)
+        self.assertEqual(p.opts, {"a": 1, "b": 2})
+        self.assertEqual(Peeker.foo, 1)
+        self.assertEqual(Peeker.opts, {"a": 1})
+
+    def test_user_attributes(self):
+        p = _peeker("a", [(0, 1)])
+        p.user_attr = 5
+        self.assertEqual(p.user_attr, 5)
+
+
+class TestPeekerUnitTime(unittest.TestCase):
+
+    def setUp(self):
+        Peeker.clear()
+        self.p = _peeker("a", [(0, 0), (4, 1), (8, 0), (12, 1)])
+
+    def tearDown(self):
+        Peeker.clear()
+        Trace.unit_time = 1
+
+    def test_edges_use_peeker_unit_time(self):
+        # After displaying the peekers, edges on their traces are found using
+        # the peekers' unit time of 4 instead of the Trace default of 1.
+        Peeker.to_wavejson()
+        self.assertEqual(Peeker.unit_time, 4)
+        edges = self.p.trace.anyedge()
+        self.assertEqual(
+            list(edges),
+            [Sample(t, v) for t, v in [(0, 0), (4, 1), (8, 1), (12, 1), (16, 0)]],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_trace
+----------------------------------
+
+Tests for the `Trace` class.
+"""
+
+import operator
+import unittest
+
+from myhdlpeek.trace import Sample, Trace
+
+
+def _trace(*samples, **kwargs):
+    """Return a Trace made from (time, value) pairs."""
+    trace = Trace([Sample(time, value) for time, value in samples])
+    for k, v in kwargs.items():
+        setattr(trace, k, v)
+    return trace
+
+
+class TestTraceOps(unittest.TestCase):
+
+    def assertSamples(self, trace, samples):
+        self.assertEqual(list(trace), [Sample(t, v) for t, v in samples])
+
+    def setUp(self):
+        self.a = _trace((0, 1), (2, 3), (5, 0))
+        self.b = _trace((1, 2), (2, 1))
+
+    def test_binary_op(self):
+        # Each trace holds its first value before its first sample.
+        self.assertSamples(self.a + self.b, [(0, 3), (1, 3), (2, 4), (5, 1)])
+        self.assertSamples(self.a - self.b, [(0, -1), (1, -1), (2, 2), (5, -1)])
+        self.assertSamples(self.a & self.b, [(0, 0), (1, 0), (2, 1), (5, 0)])
+
+    def test_op_with_constant(self):
+        self.assertSamples(self.a * 2, [(0, 2), (2, 6), (5, 0)])
+
+    def test_unary_op(self):
+        self.assertSamples(-self.a, [(0, -1), (2, -3), (5, 0)])
+
+    def test_comparison(self):
+        self.assertSamples(self.a > self.b, [(0, 0), (1, 0), (2, 1), (5, 0)])
+        self.assertSamples(self.a == 3, [(0, 0), (2, 1), (5, 0)])
+
+    def test_binarized_division(self):
+        # Dividing binarized traces acts like Python ints, not NumPy int8s.
+        ones = _trace((0, 1), (2, 3)).binarize()
+        self.assertSamples(ones / ones, [(0, 1.0), (2, 1.0)])
+        self.assertSamples(ones // ones, [(0, 1), (2, 1)])
+        edges = _trace((0, 0), (2, 1)).anyedge()  # Zero at time 0.
+        for op in (operator.truediv, operator.floordiv, operator.mod):
+            with self.assertRaises(ZeroDivisionError):
+                op(ones, edges)
+
+    def test_same_time_samples(self):
+        # Only the last of several samples at the same time is kept in the result.
+        trc = _trace((0, 0), (1, 1), (1, 2), (3, 0))
+        self.assertSamples(trc + 0, [(0, 0), (1, 2), (3, 0)])
+        self.assertSamples(trc != 0, [(0, 0), (1, 1), (3, 0)])
+
+    def test_edges(self):
+        # Edges are found by comparing the trace with itself delayed by one unit time.
+        trc = _trace((0, 0), (2, 1), (4, 1), (6, 0))
+        self.assertSamples(
+            trc.anyedge(),
+            [(0, 0), (1, 0), (2, 1), (3, 0), (4, 0), (5, 0), (6, 1), (7, 0)],
+        )
+        self.assertSamples(
+            trc.posedge(),
+            [(0, 0), (1, 0), (2, 1), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0)],
+        )
+        self.assertSamples(
+            trc.negedge(),
+            [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 1), (7, 0)],
+        )
+        self.assertEqual(trc.anyedge().trig_times(), [2, 6])
+
+    def test_edges_same_time_samples(self):
+        # Samples at the same time give a single edge sample at that time.
+        trc = _trace((0, 0), (0, 1), (2, 0))
+        self.assertSamples(trc.anyedge(), [(0, 1), (1, 0), (2, 1), (3, 0)])
+        self.assertEqual(trc.anyedge().trig_times(), [0, 2])
+
+
+class TestTraceWaveJSON(unittest.TestCase):
+
+    def wave(self, samples, start_time, stop_time, num_bits=1):
+        trace = _trace(*samples, name="x", num_bits=num_bits)
+        return trace.to_wavejson(start_time, stop_time)
+
+    def test_empty_window(self):
+        # No samples inside the window, so the value at the start is held throughout.
+        self.assertEqual(self.wave([(0, 1), (10, 0)], 3, 6), {"name": "x", "wave": "1..."})
+        self.assertEqual(self.wave([(0, 1), (4, 0)], 4, 4), {"name": "x", "wave": "0"})
+
+    def test_start_before_first_sample(self):
+        # The first value is extended back to the start of the window.
+        self.assertEqual(
+            self.wave([(2, 1), (3, 0), (5, 1)], 0, 6), {"name": "x", "wave": "1..0.1."}
+        )
+
+    def test_constant_tail(self):
+        self.assertEqual(
+            self.wave([(0, 0), (1, 1), (3, 0)], 0, 8), {"name": "x", "wave": "01.0....."}
+        )
+
+    def test_same_time_samples(self):
+        # Only the last sample at a time is shown.
+        self.assertEqual(
+            self.wave([(0, 0), (2, 1), (2, 0), (4, 1)], 0, 5), {"name": "x", "wave": "0...1."}
+        )
+
+    def test_bus(self):
+        # Repeated values extend the previous data envelope.
+        self.assertEqual(
+            self.wave([(0, 3), (2, 3), (3, 5), (6, 12)], 0, 8, num_bits=4),
+            {"name": "x", "wave": "=..=..=..", "data": ["3", "5", "12"]},
+        )
+        self.assertEqual(
+            self.wave([(0, 3), (2, 7), (3, 5), (6, 12)], 1, 5, num_bits=4),
+            {"name": "x", "wave": "===..", "data": ["3", "7", "5"]},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()